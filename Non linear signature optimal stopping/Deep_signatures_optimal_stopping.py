@@ -8,27 +8,94 @@ This file contains three ways of computing lower and upper bounds to the optimal
 deep neural networks on signatures, and using the signature kernel.
 """
 
+import time
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.callbacks import EarlyStopping
 from tensorflow.keras import layers, models
 from tensorflow.keras.optimizers.legacy import Adam  # Updated for M1/M2/M3 Mac compatibility
 from tensorflow.keras import regularizers
-from functools import reduce
-from tensorflow.python.autograph.impl.conversion import _is_known_loaded_type as _orig_is_known_loaded_type
-import tensorflow.python.autograph.impl.conversion as _conv
 
-# Disable AutoGraph conversion to run functions eagerly (avoids isinstance TypeError in conversion)
-tf.config.run_functions_eagerly(True)
+# Use half precision compute (Tensor Cores) for the dense networks when a GPU is available: bfloat16 on
+# GPUs supporting it (compute capability 8.0 and newer), which has the range of float32 and needs no loss
+# scaling, float16 otherwise
+_GPUS = tf.config.list_physical_devices('GPU')
+MIXED_PRECISION = len(_GPUS) > 0
+if MIXED_PRECISION:
+    _compute_capability = tf.config.experimental.get_device_details(_GPUS[0]).get('compute_capability', (0, 0))
+    PRECISION_POLICY = 'mixed_bfloat16' if _compute_capability >= (8, 0) else 'mixed_float16'
+    tf.keras.mixed_precision.set_global_policy(PRECISION_POLICY)
+else:
+    PRECISION_POLICY = 'float32'
+LOSS_SCALING = PRECISION_POLICY == 'mixed_float16'
+
+# Storage dtype of the signature features. Under float16 mixed precision the first layer casts them to
+# float16 anyway, so they are stored in float16, halving their memory and bandwidth, and upcast on the fly
+FEATURE_DTYPE = np.float16 if PRECISION_POLICY == 'mixed_float16' else np.float32
+
+# Make sure the Grappler passes folding constants (e.g. the gather indices of the exercise dates), fusing
+# ops and choosing the GPU data layout run on the graphs, whatever the defaults of the TensorFlow build.
+# XLA is requested per model with jit_compile (falling back to plain graph mode when it cannot compile the
+# training step), so it is not enabled globally here
+try:
+    tf.config.optimizer.set_experimental_options({'layout_optimizer': True,
+                                                  'constant_folding': True,
+                                                  'remapping': True})
+except (AttributeError, ValueError):
+    # Older TensorFlow versions without these options
+    pass
+
+def _tensor_core_size(n):
+    """
+    Rounds n up to a multiple of 8 under mixed precision, so that the matrix multiplications run on Tensor Cores.
+    """
+    if not MIXED_PRECISION:
+        return n
+    return -(-n // 8) * 8
 
-def _safe_is_known_loaded_type(f, module_name, entity_name):
-    try:
-        return _orig_is_known_loaded_type(f, module_name, entity_name)
-    except TypeError:
-        return False
+def _pad_features(S_sig, dates=None):
+    """
+    Converts signatures of shape (M, N+1, D) to FEATURE_DTYPE, padding the feature axis with zeros up to the
+    Tensor Core size, in a single copy. With dates, only the features at these dates are kept, stored
+    date-major as (len(dates), M, D) so that every exercise date is a contiguous block.
+    """
+    M, N, D = S_sig.shape
+    size = _tensor_core_size(D)
+    if dates is None:
+        if size == D:
+            return S_sig.astype(FEATURE_DTYPE, copy=False)
+        padded = np.zeros((M, N, size), dtype=FEATURE_DTYPE)
+        padded[..., :D] = S_sig
+        return padded
+    padded = np.zeros((len(dates), M, size), dtype=FEATURE_DTYPE)
+    for i, k in enumerate(dates):
+        padded[i, :, :D] = S_sig[:, k]
+    return padded
+
+def _fused_batch_normalization(shape):
+    """
+    Batch normalization over the last axis for inputs of the given shape (without batch axis). Keras only
+    dispatches to the single fused kernel for 4D inputs, so the inputs are reshaped to 4D and back.
+    """
+    return [layers.Reshape((-1, 1, shape[-1])),
+            layers.BatchNormalization(fused=True),
+            layers.Reshape(shape)]
 
-# Monkey-patch to prevent isinstance TypeError in autograph conversion
-_conv._is_known_loaded_type = _safe_is_known_loaded_type
+def _fit_with_xla_fallback(model, *args, **kwargs):
+    """
+    Runs model.fit. Ops that XLA cannot compile do not fail in compile, but when the training step is first
+    run, so if that happens before any update, the model is compiled again with the same arguments but
+    without XLA, and fitted again.
+    """
+    try:
+        return model.fit(*args, **kwargs)
+    except tf.errors.InvalidArgumentError as e:
+        if not model.jit_compile or model.optimizer.iterations.numpy() > 0:
+            raise
+        print(f"Warning: Unable to compile the training step with XLA: {e}")
+        config = tf.keras.saving.deserialize_keras_object(model.get_compile_config())
+        model.compile(**dict(config, optimizer=model.optimizer, jit_compile=False))
+        return model.fit(*args, **kwargs)
 
 class DeepLongstaffSchwartzPricer:
     """
@@ -50,7 +117,8 @@ class DeepLongstaffSchwartzPricer:
         layers : int
             Number of hidden layers
         nodes : int
-            Number of neurons in each hidden layer
+            Number of neurons in each hidden layer, rounded up to a multiple of 8 under mixed precision
+            (when a GPU is available), so the same value gives a wider network on GPU than on CPU
         activation_function : str
             Activation function for hidden layers
         batch_normalization : bool
@@ -97,18 +165,22 @@ class DeepLongstaffSchwartzPricer:
             Number of validation paths
         """
         
-        M, N, feature_dim = S_training_sig.shape
+        M, N, _ = S_training_sig.shape
         N= N-1
         M2, _, _ = S_testing_sig.shape
-        subindex = [int((j+1)*N/self.N1) for j in range(self.N1)]
-        subindex2 = [int((j)*N/self.N1) for j in range(self.N1+1)]
+        # Exercise dates as an index array, integer division matches int((j+1)*N/N1) without rounding issues
+        subindex = np.arange(1, self.N1 + 1) * N // self.N1
         ttt = np.linspace(0, self.T, self.N1 + 1)
         
+        # Signatures are stored date-major as FEATURE_DTYPE, (N1, M, feature_dim), so that every
+        # exercise date is a contiguous block that can be fed to Keras without a copy. Only the exercise
+        # dates are gathered, converted and padded
         Payoff_exercise_training = Payoff_training[:, subindex]
-        S_exercise_training_sig = S_training_sig[:, subindex, :]  # Adjust index for signatures
+        S_exercise_training_sig = _pad_features(S_training_sig, subindex)
         
         Payoff_exercise_testing = Payoff_testing[:, subindex]
-        S_exercise_testing_sig = S_testing_sig[:, subindex, :]  # Adjust index for signatures
+        S_exercise_testing_sig = _pad_features(S_testing_sig, subindex)
+        feature_dim = S_exercise_training_sig.shape[-1]
         
         regr = [None] * (self.N1 - 1)
         value = Payoff_exercise_training[:, -1]
@@ -122,9 +194,9 @@ class DeepLongstaffSchwartzPricer:
             M_old = M
             for k in reversed(range(1, self.N1)):
                 M_new = M_old - M_val
-                S_exercise_training_new = S_exercise_training_sig[:M_new, k-1, :]
+                S_exercise_training_new = S_exercise_training_sig[k-1, :M_new]
                 value_new = value[:M_new] * dtt
-                S_exercise_training_validation = S_exercise_training_sig[M_new:M_old, k-1, :]
+                S_exercise_training_validation = S_exercise_training_sig[k-1, M_new:M_old]
                 value_validation = value[M_new:M_old]
                 
                 regr[k-1] = LongstaffSchwartzModel(
@@ -145,7 +217,7 @@ class DeepLongstaffSchwartzPricer:
                     Transfer weights from the next exercise date to the current one, and reduce to one epoch.
                     """
                     try:
-                        regr[k-1].set_weights(regr[k].get_weights())
+                        regr[k-1].copy_weights(regr[k])
                         epochs = 1
 
                     except ValueError as e:
@@ -179,9 +251,9 @@ class DeepLongstaffSchwartzPricer:
                 
                 reg = regr[k-1].predict(S_exercise_training_new)
                 
-                for m in range(M_new):
-                    if reg[m] <= Payoff_exercise_training[m, k-1]:
-                        value_new[m] = Payoff_exercise_training[m, k-1]
+                # Exercise on the paths where the continuation value is below the payoff
+                payoff_new = Payoff_exercise_training[:M_new, k-1]
+                np.copyto(value_new, payoff_new, where=reg[:, 0] <= payoff_new)
                 
                 value = value_new
                 M_old = M_new
@@ -193,11 +265,14 @@ class DeepLongstaffSchwartzPricer:
             """
             for j in reversed(range(1, self.N1)):
                 value = value * dtt
-                ITM = [m for m in range(M) if Payoff_exercise_training[m, j-1] > 0]
+                ITM = np.flatnonzero(Payoff_exercise_training[:, j-1] > 0)
                 
                 if len(ITM) <= 1:
                     continue
                 
+                # Fancy indexing copies, so gather the in the money features once for fit and predict
+                S_exercise_training_itm = S_exercise_training_sig[j-1, ITM]
+                
                 regr[j-1] = LongstaffSchwartzModel(
                     feature_dim=feature_dim,
                     layers_number=self.layers,
@@ -216,7 +291,7 @@ class DeepLongstaffSchwartzPricer:
                     Transfer weights from the next exercise date to the current one, and reduce to one epoch.
                     """
                     try:
-                        regr[j-1].set_weights(regr[j].get_weights())
+                        regr[j-1].copy_weights(regr[j])
                         epochs = 1
 
                     except ValueError as e:
@@ -227,7 +302,7 @@ class DeepLongstaffSchwartzPricer:
                 early_stopping = EarlyStopping(monitor='loss', patience=5)
                 # Fit the model
                 regr[j-1].fit(
-                    S_exercise_training_sig[ITM, j-1, :],
+                    S_exercise_training_itm,
                     value[ITM],
                     batch_size=batch,
                     epochs=epochs,
@@ -235,53 +310,71 @@ class DeepLongstaffSchwartzPricer:
                     callbacks=[early_stopping]
                 )
                 
-                value_estimate = regr[j-1].predict(S_exercise_training_sig[ITM, j-1, :])
+                value_estimate = regr[j-1].predict(S_exercise_training_itm)
                 
-                for m, itm in enumerate(ITM):
-                    # Update the value of the option if the estimated value is less than the payoff
-                    if value_estimate[m] <= Payoff_exercise_training[itm, j-1]:
-                        value[itm] = Payoff_exercise_training[itm, j-1]
+                # Update the value of the option if the estimated value is less than the payoff
+                exercise = ITM[value_estimate[:, 0] <= Payoff_exercise_training[ITM, j-1]]
+                value[exercise] = Payoff_exercise_training[exercise, j-1]
         
         else:
             raise ValueError(f"Invalid mode: {self.mode}")
         
         # Compute true lower bound for testing data
-        value_testing = Payoff_exercise_testing[:, -1]
-        reg = np.zeros((M2, self.N1))
-        
-        for j in range(self.N1 - 1):
-            # If the model is not trained, set the value to a large number
-            if regr[j] is None:
-                reg[:, j] = 10**8
-            else:
-                # Predict the value of the option at the current exercise date
-                reg[:, j] = regr[j].predict(S_exercise_testing_sig[:, j, :])[:, 0]
-        
-        if self.mode == "Standard":
+        # If the model is not trained, set the value to a large number
+        reg = np.full((M2, self.N1), 10**8, dtype=np.float32)
+        trained = [j for j in range(self.N1 - 1) if regr[j] is not None]
+        
+        if trained:
+            # Predict the value of the option at all trained exercise dates at once, calling the model
+            # directly rather than through predict, which sets up a dataset and batching loop. Paths are
+            # evaluated in slices to bound the memory of the activations, which are live for every date
+            stacked = self.stack_regressions(regr, trained, feature_dim)
+            slice_size = 8192
+            for i in range(0, M2, slice_size):
+                paths = slice(i, i + slice_size)
+                reg[paths, trained] = stacked([S_exercise_testing_sig[j, paths] for j in trained], training=False).numpy()
+        
+        # Paths may stop at every exercise date before the last one, and always stop at the last one
+        stop = np.ones((M2, self.N1), dtype=bool)
+        stop[:, :-1] = reg[:, :-1] <= Payoff_exercise_testing[:, :-1]
+        
+        if self.mode == "American Option":
             """
-            Standard mode: Use all paths for regression at each exercise date
+            American Option mode: Only stop in the money
             """
-            for m in range(M2):
-                i = 0
-                while i < self.N1 - 1 and reg[m, i] > Payoff_exercise_testing[m, i]:
-                    i += 1
-                value_testing[m] = Payoff_exercise_testing[m, i] * np.exp(-self.r * self.T * (ttt[i+1] - ttt[1]))
+            stop[:, :-1] &= Payoff_exercise_testing[:, :-1] != 0
         
-        elif self.mode == "American Option":
-            """
-            American Option mode: Only use in the money paths for regression at each exercise date
-            """
-            for m in range(M2):
-                i = 0
-                while i < self.N1 - 1 and (Payoff_exercise_testing[m, i] == 0 or reg[m, i] > Payoff_exercise_testing[m, i]):
-                    i += 1
-                value_testing[m] = Payoff_exercise_testing[m, i] * np.exp(-self.r * self.T * (ttt[i+1] - ttt[1]))
+        # The stopping time is the first exercise date where stopping is optimal
+        tau = np.argmax(stop, axis=1)
+        value_testing = Payoff_exercise_testing[np.arange(M2), tau] * np.exp(-self.r * self.T * (ttt[tau+1] - ttt[1]))
         
         lower_bound = np.mean(value_testing)
         lower_bound_std = np.std(value_testing)
         
         return lower_bound, lower_bound_std, regr
 
+    def stack_regressions(self, regr, dates, feature_dim):
+        """
+        Packs the regressions of the given exercise dates into a single multi-output model, mapping
+        one (M, feature_dim) input per date to continuation values of shape (M, len(dates)).
+        
+        Parameters
+        ----------
+        regr : list
+            Trained LongstaffSchwartzModel for each exercise date
+        dates : list
+            Exercise dates (indices into regr) to include
+        feature_dim : int
+            Dimension of the features at each exercise date
+        """
+        inputs = [layers.Input(shape=(feature_dim,)) for _ in dates]
+        outputs = [regr[j].model(x) for x, j in zip(inputs, dates)]
+        if len(outputs) > 1:
+            outputs = layers.Concatenate(axis=1, dtype='float32')(outputs)
+        else:
+            outputs = outputs[0]
+        return models.Model(inputs, outputs)
+
 class DeepDualPricer:
     """
     Computes upper bounds of optimal stopping problem using deep neural networks on signatures.
@@ -303,7 +396,8 @@ class DeepDualPricer:
         layers : int
             Number of hidden layers
         nodes : int
-            Number of neurons in each hidden layer
+            Number of neurons in each hidden layer, rounded up to a multiple of 8 under mixed precision
+            (when a GPU is available), so the same value gives a wider network on GPU than on CPU
         activation_function : str
             Activation function for hidden layers
         batch_normalization : bool
@@ -356,6 +450,8 @@ class DeepDualPricer:
         learning_rate : float
             Learning rate for training
         """
+        S_training_sig = _pad_features(S_training_sig)
+        S_testing_sig = _pad_features(S_testing_sig)
         M, N_sig, D = S_training_sig.shape
         M2, N_sig_test, _ = S_testing_sig.shape
         
@@ -372,20 +468,16 @@ class DeepDualPricer:
         print(f"dW data shape: {dW_training.shape}")
         print(f"Using {N_actual} time steps instead of {self.N} for model building")
         
-        # Use the actual time steps from the data for subindices
-        subindex = [int((j+1)*N_actual/self.N1) for j in range(self.N1)]
-        subindex2 = [int((j)*N_actual/self.N1) for j in range(self.N1+1)]
-        
-        # Make sure indices don't exceed the data dimensions
-        subindex = [min(idx, N_actual-1) for idx in subindex]
-        subindex2 = [min(idx, N_actual) for idx in subindex2]
+        # Use the actual time steps from the data for subindices, making sure they don't exceed the data dimensions
+        subindex = np.minimum(np.arange(1, self.N1 + 1) * N_actual // self.N1, N_actual - 1)
+        subindex2 = np.minimum(np.arange(self.N1 + 1) * N_actual // self.N1, N_actual)
         
         # Build the network model using the actual time steps
         model, rule_model = DualNetworkModel(
             n=self.N1 + 1,
             n2=N_actual + 1,  # Use actual time steps, not self.N
             I=self.layers,
-            q=self.nodes + D,
+            q=_tensor_core_size(self.nodes + D),
             d=D,
             activation_function=self.activation_function,
             batch_normalization=self.batch_normalization,
@@ -396,25 +488,30 @@ class DeepDualPricer:
         ).build_network_dual()
 
         optimizer = Adam(learning_rate=learning_rate)
-        try:
-            # Try with run_eagerly for newer TensorFlow versions that support it
-            model.compile(optimizer=optimizer, run_eagerly=True)
-        except TypeError:
-            # Fall back to standard compile for older versions or if run_eagerly causes issues
-            model.compile(optimizer=optimizer)
+        if LOSS_SCALING:
+            optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+        # Compile with XLA, so that the trunk, the martingale and the loss are fused. If XLA cannot compile the
+        # training step, the fit below falls back to graph mode without XLA
+        model.compile(optimizer=optimizer, jit_compile=True)
 
         early_stopping = EarlyStopping(monitor='val_loss', patience=5)
         
         # Important: Trim Payoff to exactly N_actual steps, not N_actual+1
         # This matches the expected input dimensions in the model
-        Payoff_train_trimmed = Payoff_training[:, :N_actual]
-        Payoff_test_trimmed = Payoff_testing[:, :N_actual]
+        # Cast the model inputs once to contiguous float32 arrays (the dtype of the model inputs), rather than
+        # having each batch of the float64 payoffs and increments converted during training and prediction.
+        # Payoff_testing itself stays in float64 for the upper bound below
+        Payoff_train_trimmed = np.ascontiguousarray(Payoff_training[:, :N_actual], dtype=np.float32)
+        Payoff_test_trimmed = np.ascontiguousarray(Payoff_testing[:, :N_actual], dtype=np.float32)
+        dW_training = np.ascontiguousarray(dW_training, dtype=np.float32)
+        dW_testing = np.ascontiguousarray(dW_testing, dtype=np.float32)
         
         print(f"Model expects Payoff shape: (batch_size, {N_actual})")
         print(f"Trimmed Payoff shape: {Payoff_train_trimmed.shape}")
         
         # Fit the model with the correctly sized inputs
-        model.fit(
+        _fit_with_xla_fallback(
+            model,
             [S_training_sig[:M_val], Payoff_train_trimmed[:M_val], dW_training[:M_val]],
             y=None,
             batch_size=batch,
@@ -437,14 +534,17 @@ class DeepDualPricer:
             MG = MG[:, :N_actual]
         
         # Create MG with zeros prepended, now with correct dimensions
-        MG_with_zeros = np.concatenate((np.zeros((M2, 1)), MG), axis=-1)
+        MG_with_zeros = np.zeros((M2, MG.shape[1] + 1), dtype=MG.dtype)
+        MG_with_zeros[:, 1:] = MG
         print(f"MG with zeros shape: {MG_with_zeros.shape}")
         
         # Calculate the upper bound using your original approach
         # Just make sure to use Payoff_testing dimensions that match MG_with_zeros
-        valid_indices = [idx for idx in subindex2 if idx < N_actual+1]
-        diffs = Payoff_testing[:, valid_indices] - MG_with_zeros[:, valid_indices]
-        max_diffs = np.max(diffs, axis=1)
+        valid_indices = subindex2[subindex2 < N_actual + 1]
+        # Fancy indexing copies the payoffs anyway, so subtract the martingale in place in that copy
+        diffs = Payoff_testing[:, valid_indices]
+        np.subtract(diffs, MG_with_zeros[:, valid_indices], out=diffs)
+        max_diffs = diffs.max(axis=1)
         
         upper_bound = np.mean(max_diffs)
         upper_bound_std = np.std(max_diffs)
@@ -460,7 +560,9 @@ class LongstaffSchwartzModel:
     Attributes:
         feature_dim (int): The input dimension of the network (dimension of the feature map/signature).
         layers_number (int): Number of hidden layers.
-        nodes (int): Number of neurons in each hidden layer.
+        nodes (int): Number of neurons in each hidden layer. Under mixed precision (when a GPU is available)
+            it is rounded up to a multiple of 8 for the Tensor Cores, e.g. 10 becomes 16, so the same value gives
+            a wider network on GPU than on CPU. The feature dimension of the pricers is padded likewise.
         activation_function (str): Activation function for hidden layers.
         batch_normalization (bool): Whether to use batch normalization at the input.
         regularizer (float): L2 regularization factor.
@@ -473,7 +575,7 @@ class LongstaffSchwartzModel:
                  layer_normalization=False):
         self.feature_dim = feature_dim
         self.layers_number = layers_number
-        self.nodes = nodes
+        self.nodes = _tensor_core_size(nodes)
         self.activation_function = activation_function
         self.batch_normalization = batch_normalization
         self.regularizer = regularizer
@@ -485,10 +587,10 @@ class LongstaffSchwartzModel:
         model = models.Sequential()
 
         # Input layer with optional batch normalization
+        model.add(layers.Input(shape=(self.feature_dim,)))
         if self.batch_normalization:
-            model.add(layers.BatchNormalization(input_shape=(self.feature_dim,)))
-        else:
-            model.add(layers.Input(shape=(self.feature_dim,)))
+            for layer in _fused_batch_normalization((self.feature_dim,)):
+                model.add(layer)
 
         # Set activation function
         if self.activation_function == "LeakyRelu":
@@ -517,65 +619,50 @@ class LongstaffSchwartzModel:
             if self.dropout:
                 model.add(layers.Dropout(0.5))
 
-        # Output layer
-        model.add(layers.Dense(1, activation='linear'))
+        # Output layer, kept in float32 for a numerically stable loss under mixed precision
+        model.add(layers.Dense(1, activation='linear', dtype='float32'))
 
         return model
 
-    def compile(self, learning_rate=0.001, loss='mse', metrics=['mae']):
+    def compile(self, learning_rate=0.001, loss='mse', metrics=['mae'], steps_per_execution=32):
         optimizer = Adam(learning_rate=learning_rate)
-        try:
-            # First try with run_eagerly
-            self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics, run_eagerly=True)
-        except Exception as e:
-            print(f"Warning: Unable to compile with run_eagerly=True: {e}")
-            try:
-                # Then try without run_eagerly
-                self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics)
-            except Exception as e:
-                print(f"Warning: Standard compilation failed: {e}")
-                # Last resort: Set a flag indicating compilation failed
-                self.compilation_failed = True
-                print("Setting model to fallback mode - some functionality may be limited")
-
-    def fit(self, X, y, epochs=100, batch_size=32, verbose=1, callbacks=None):
-        # Check if compilation failed and use fallback mode
-        if hasattr(self, 'compilation_failed') and self.compilation_failed:
-            print("Using fallback mode for fitting (no training will occur)")
-            return None
-
-        # Convert inputs to numpy arrays to avoid TensorFlow type checking issues
-        X_np = np.array(X) if not isinstance(X, np.ndarray) else X
-        y_np = np.array(y) if not isinstance(y, np.ndarray) else y
-        
-        try:
-            return self.model.fit(
-                X_np, y_np,
-                epochs=epochs,
-                batch_size=batch_size,
-                verbose=verbose,
-                callbacks=callbacks
-            )
-        except Exception as e:
-            print(f"Error during fit: {e}")
-            print("Training skipped due to error")
-            return None
+        if LOSS_SCALING:
+            optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+        # Compile with XLA, fusing the ops of the training step (the pricers build and compile a new model at
+        # every exercise date, so each date compiles its own step), and run several steps per graph call to
+        # avoid the Python overhead of every small batch. If XLA cannot compile the training step, fit falls
+        # back to compiling without it
+        self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics, jit_compile=True,
+                           steps_per_execution=steps_per_execution)
+
+    def fit(self, X, y, epochs=100, batch_size=32, verbose=1, callbacks=None, validation_data=None):
+        # Convert inputs to contiguous arrays of the storage dtype, this is a no-op (no copy) when they already are
+        X_np = np.ascontiguousarray(X, dtype=FEATURE_DTYPE)
+        y_np = np.ascontiguousarray(y, dtype=np.float32)
+        
+        # Feed the data through a prefetched tf.data pipeline, so that preparing the next batch
+        # overlaps with the current training step
+        dataset = tf.data.Dataset.from_tensor_slices((X_np, y_np)).shuffle(len(X_np)).batch(batch_size)
+        dataset = dataset.prefetch(tf.data.AUTOTUNE)
+        if validation_data is not None:
+            X_val = np.ascontiguousarray(validation_data[0], dtype=FEATURE_DTYPE)
+            y_val = np.ascontiguousarray(validation_data[1], dtype=np.float32)
+            validation_data = tf.data.Dataset.from_tensor_slices((X_val, y_val)).batch(batch_size)
+            validation_data = validation_data.prefetch(tf.data.AUTOTUNE)
+        
+        return _fit_with_xla_fallback(
+            self.model,
+            dataset,
+            epochs=epochs,
+            verbose=verbose,
+            callbacks=callbacks,
+            validation_data=validation_data
+        )
 
     def predict(self, X):
-        # Check if compilation failed and use fallback mode
-        if hasattr(self, 'compilation_failed') and self.compilation_failed:
-            print("Using fallback mode for prediction (returning zeros)")
-            # Return an array of zeros with the right shape
-            return np.zeros((X.shape[0], 1))
-
-        # Convert input to numpy array to avoid type checking issues
-        X_np = np.array(X)
-        try:
-            return self.model.predict(X_np)
-        except Exception as e:
-            print(f"Error during predict: {e}")
-            print("Returning zeros due to error")
-            return np.zeros((X.shape[0], 1))
+        # Convert input to a contiguous array of the storage dtype, this is a no-op (no copy) when it already is
+        X_np = np.ascontiguousarray(X, dtype=FEATURE_DTYPE)
+        return self.model.predict(X_np)
 
     def summary(self):
         return self.model.summary()
@@ -596,11 +683,24 @@ class LongstaffSchwartzModel:
     def set_weights(self, weights):
         self.model.set_weights(weights)
 
+    def copy_weights(self, other):
+        # Copy the weights of a model with the same architecture variable by variable, on the device,
+        # instead of a roundtrip through numpy with get_weights/set_weights
+        if len(self.model.weights) != len(other.model.weights):
+            raise ValueError(f"Expected {len(self.model.weights)} weights, received {len(other.model.weights)}")
+        # Check all the shapes before the first assign, so that a mismatch leaves the weights unchanged
+        for variable, weight in zip(self.model.weights, other.model.weights):
+            if variable.shape != weight.shape:
+                raise ValueError(f"Shape mismatch for {variable.name}: expected {variable.shape}, "
+                                 f"received {weight.shape}")
+        for variable, weight in zip(self.model.weights, other.model.weights):
+            variable.assign(weight)
+
 
 
 class DeepMartingales(tf.keras.layers.Layer):
-    def __init__(self):
-        super(DeepMartingales, self).__init__()
+    def __init__(self, **kwargs):
+        super(DeepMartingales, self).__init__(**kwargs)
         self.steps = None
 
     def build(self, input_shape):
@@ -608,6 +708,7 @@ class DeepMartingales(tf.keras.layers.Layer):
 
     def call(self, inputs, **kwargs):
         rule, dW = inputs
+        # Models compiled with jit_compile fuse the product and the cumulative sum into a single kernel
         return tf.cumsum(rule * dW, axis=1)
 
 class DualStoppingLoss(tf.keras.layers.Layer):
@@ -615,6 +716,8 @@ class DualStoppingLoss(tf.keras.layers.Layer):
         rule, Y = inputs
         
         out = tf.math.reduce_mean(tf.math.reduce_max(Y-rule,axis=1))
+        # Keep the loss in float32 whatever the precision policy
+        out = tf.cast(out, tf.float32)
 
         self.add_loss(out)
 
@@ -623,7 +726,7 @@ class DualStoppingLoss(tf.keras.layers.Layer):
 class DualNetworkModel:
     def __init__(self, n, n2, I, q, d, activation_function='relu',
                  batch_normalization=False, regularizer=0.01, dropout=False,
-                 attention_layer=False, layer_normalization=False):
+                 attention_layer=False, layer_normalization=False, strategy=None):
         self.n = n  # exercise dates
         self.n2 = n2  # discretization
         self.I = I  # number of layers
@@ -635,7 +738,18 @@ class DualNetworkModel:
         self.dropout = dropout
         self.attention_layer = attention_layer
         self.layer_normalization = layer_normalization
-        self.model, self.rule_model = self.build_network_dual()
+        # Distribution strategy, e.g. tf.distribute.MirroredStrategy() for data parallelism over several GPUs
+        self.strategy = strategy if strategy is not None else tf.distribute.get_strategy()
+        with self.strategy.scope():
+            self.model, self.rule_model = self.build_network_dual()
+        self._rule_fn = self.rule_function()
+
+    def rule_function(self):
+        # Forward pass of the rule model traced once for any batch size, bypassing the Keras predict loop
+        return tf.function(
+            lambda logsig, BM: self.rule_model([logsig, BM], training=False),
+            input_signature=[tf.TensorSpec([None, self.n2, self.d], tf.float32),
+                             tf.TensorSpec([None, self.n2-1], tf.float32)])
 
     def dense_neural_network_dual(self):
         if self.activation_function == "LeakyRelu":
@@ -647,7 +761,7 @@ class DualNetworkModel:
 
         layers_list = []
         if self.batch_normalization:
-            layers_list.append(layers.BatchNormalization())
+            layers_list.extend(_fused_batch_normalization((self.n2, self.d)))
 
         layers_list.append(tf.keras.layers.Dense(self.q, activation=activation,
                                                  kernel_regularizer=regularizers.l2(self.regularizer)))
@@ -671,8 +785,9 @@ class DualNetworkModel:
             if self.dropout:
                 layers_list.append(tf.keras.layers.Dropout(0.5))
 
-        layers_list.append(tf.keras.layers.Dense(1, activation=None))
-        layers_list.append(tf.keras.layers.Flatten())
+        # Output kept in float32 so that the martingale and the loss are not computed in half precision
+        layers_list.append(tf.keras.layers.Dense(1, activation=None, dtype='float32'))
+        layers_list.append(tf.keras.layers.Flatten(dtype='float32'))
 
         return layers_list
 
@@ -681,45 +796,36 @@ class DualNetworkModel:
         input_y = tf.keras.Input(shape=(self.n2-1,), name='Y')
         input_BM = tf.keras.Input(shape=(self.n2-1,), name='dW')
 
+        # Stack the layers as one Sequential trunk, so that it is traced and fused as a single subgraph
         dnn_layers = self.dense_neural_network_dual()
-        dnn_output = reduce(lambda x, f: f(x), [input_logsig] + dnn_layers)
+        dnn_output = tf.keras.Sequential(dnn_layers)(input_logsig)
 
-        rule_layer = DeepMartingales()([dnn_output[:, 0:self.n2-1], input_BM])
+        rule_layer = DeepMartingales(dtype='float32')([dnn_output[:, 0:self.n2-1], input_BM])
         
         # The problem is that we need indices for self.n exercise dates 
         # But our tensor only has self.n2-1 available indices (0 to self.n2-2)
         
-        # Calculate indices ensuring they're all valid
-        valid_indices = []
-        
         # We need exactly self.n-1 indices (for all exercise dates after the first)
         n_indices_needed = self.n - 1
         
         # If we have fewer time steps than exercise dates, we'll need to reuse some indices
         if n_indices_needed <= self.n2-1:
             # We have enough unique indices, distribute them evenly
-            for i in range(n_indices_needed):
-                # Calculate linearly spaced indices
-                idx = int(i * (self.n2-1) / (n_indices_needed))
-                valid_indices.append(idx)
+            valid_indices = np.arange(n_indices_needed, dtype=np.int32) * (self.n2-1) // n_indices_needed
         else:
             # We have more exercise dates than time steps
-            # Use all available indices and repeat the last one if needed
-            valid_indices = list(range(self.n2-1))
-            # Add the last index repeatedly until we have enough
-            while len(valid_indices) < n_indices_needed:
-                valid_indices.append(self.n2-2)
+            # Use all available indices and repeat the last one until we have enough
+            valid_indices = np.minimum(np.arange(n_indices_needed, dtype=np.int32), self.n2-2)
         
-        print(f"Using indices: {valid_indices} for {n_indices_needed} exercise dates")
+        print(f"Using indices: {valid_indices.tolist()} for {n_indices_needed} exercise dates")
         
-        # Convert to TensorFlow constant to avoid conversion issues
-        tf_indices = tf.constant(valid_indices, dtype=tf.int32)
+        tf_indices = tf.constant(valid_indices)
         
         # Use tf.gather with the properly calculated indices
         rule_exercise = tf.gather(rule_layer, tf_indices, axis=1)
         y_exercise = tf.gather(input_y, tf_indices, axis=1)
         
-        loss_layer = DualStoppingLoss()([rule_exercise, y_exercise])
+        loss_layer = DualStoppingLoss(dtype='float32')([rule_exercise, y_exercise])
 
         model = tf.keras.Model([input_logsig, input_y, input_BM], loss_layer)
         rule_model = tf.keras.Model([input_logsig, input_BM], rule_layer)
@@ -729,74 +835,122 @@ class DualNetworkModel:
 
         return model, rule_model
 
-    def compile(self, optimizer='adam', loss='mse', metrics=['mae']):
-        try:
-            # First try with run_eagerly
-            self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics, run_eagerly=True)
-        except Exception as e:
-            print(f"Warning: Unable to compile with run_eagerly=True: {e}")
-            try:
-                # Then try without run_eagerly
-                self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics)
-            except Exception as e:
-                print(f"Warning: Standard compilation failed: {e}")
-                # Last resort: Set a flag indicating compilation failed
-                self.compilation_failed = True
-                print("Setting model to fallback mode - some functionality may be limited")
-
-    def fit(self, X, y, epochs=100, batch_size=32, validation_split=0.2, verbose=1):
-        # Check if compilation failed and use fallback mode
-        if hasattr(self, 'compilation_failed') and self.compilation_failed:
-            print("Using fallback mode for fitting (no training will occur)")
-            return None
-
-        # Convert inputs to numpy arrays to avoid TensorFlow type checking issues
-        X_np = np.array(X) if not isinstance(X, np.ndarray) else X
-        y_np = np.array(y) if not isinstance(y, np.ndarray) else y
-        
-        try:
-            return self.model.fit(
-                X_np, y_np,
-                epochs=epochs,
-                batch_size=batch_size,
-                validation_split=validation_split,
-                verbose=verbose
-            )
-        except Exception as e:
-            print(f"Error during fit: {e}")
-            print("Training skipped due to error")
-            return None
+    def compile(self, optimizer='adam', loss='mse', metrics=['mae'], debug=False, steps_per_execution=32):
+        # Compile in the strategy scope, so that the optimizer variables are replicated as well
+        with self.strategy.scope():
+            if debug:
+                # Eager execution, only meant for debugging since it skips graph optimizations and XLA
+                # (XLA requires run_eagerly to be off)
+                self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics, run_eagerly=True)
+                return
+            # Compile with XLA, fusing the elementwise ops and reductions of the dual loss into a few kernels
+            # instead of one kernel per op and time step, and run several of these small steps per graph call
+            # to avoid the Python overhead of every batch. If XLA cannot compile the training step, fit falls
+            # back to graph mode without XLA
+            self.model.compile(optimizer=optimizer, loss=loss, metrics=metrics, jit_compile=True,
+                               steps_per_execution=steps_per_execution)
+
+    def fit(self, X, y, epochs=100, batch_size=32, validation_split=0.2, verbose=1, auto_batch=False):
+        # Build a tf.data pipeline from the inputs instead of copying them into numpy arrays, holding out
+        # the last validation_split fraction of the paths for validation (as Keras does)
+        M = len(X[0])
+        data = (tuple(X),) if y is None else (tuple(X), y)
+        n_train = M - int(M * validation_split)
+        # Split the inputs once into separate training and validation datasets, rather than take/skip on a
+        # single dataset, which walks over the skipped paths again at every epoch. The slices are converted
+        # as they are, casting to the float32 inputs of the model only when their dtype differs
+        split = lambda paths: tf.nest.map_structure(lambda a: tf.convert_to_tensor(a[paths], dtype=tf.float32),
+                                                    data)
+        train_dataset = tf.data.Dataset.from_tensor_slices(split(slice(None, n_train)))
+        train_dataset = train_dataset.shuffle(n_train)
+        if auto_batch:
+            # Replace the given batch size by the fastest one per path on this device
+            batch_size = self.probe_batch_size(train_dataset, n_train)
+            if verbose:
+                print(f"Using batch size {batch_size}")
+        train_dataset = train_dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+        validation_dataset = None
+        if n_train < M:
+            validation_dataset = tf.data.Dataset.from_tensor_slices(split(slice(n_train, None)))
+            validation_dataset = validation_dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+        # Under a distribution strategy Keras splits every batch of the datasets across the replicas
+        return _fit_with_xla_fallback(
+            self.model,
+            train_dataset,
+            epochs=epochs,
+            validation_data=validation_dataset,
+            verbose=verbose
+        )
 
-    def predict(self, X):
-        # Check if compilation failed and use fallback mode
-        if hasattr(self, 'compilation_failed') and self.compilation_failed:
-            print("Using fallback mode for prediction (returning zeros)")
-            # Return an array of zeros with the right shape
-            if isinstance(X, list):
-                return np.zeros((X[0].shape[0], X[0].shape[1] - 1))
-            else:
-                return np.zeros((X.shape[0], X.shape[1] - 1))
-
-        try:
-            return self.rule_model.predict(X)
-        except Exception as e:
-            print(f"Error during predict: {e}")
-            print("Returning zeros due to error")
-            if isinstance(X, list):
-                return np.zeros((X[0].shape[0], X[0].shape[1] - 1))
-            else:
-                return np.zeros((X.shape[0], X.shape[1] - 1))
+    def probe_batch_size(self, dataset, n_train, candidates=(32, 64, 128, 256, 512, 1024)):
+        """
+        Picks the candidate batch size with the lowest training time per path, timing one execution of the
+        traced training step on the first batch of dataset at each size, up to the first size that does not
+        fit in memory. The steps are run on a copy of the model, so probing does not train the model itself.
+        """
+        # Same architecture and compile arguments, but its own weights and a fresh optimizer of the same config
+        config = tf.keras.saving.deserialize_keras_object(self.model.get_compile_config())
+        with self.strategy.scope():
+            clone = tf.keras.models.clone_model(self.model)
+            clone.compile(**config)
+        train_function = clone.make_train_function()
+        steps = config.get('steps_per_execution') or 1
+        best_size, best_time = candidates[0], np.inf
+        for size in candidates:
+            if size > n_train:
+                break
+            # The same batch over and over, every call of the training function runs steps training steps
+            probe = dataset.batch(size, drop_remainder=True).take(1).cache().repeat()
+            iterator = iter(self.strategy.experimental_distribute_dataset(probe))
+            try:
+                # The first call traces (and compiles) the training function for this batch shape
+                tf.nest.map_structure(lambda t: t.numpy(), train_function(iterator))
+                start = time.perf_counter()
+                tf.nest.map_structure(lambda t: t.numpy(), train_function(iterator))
+                time_per_path = (time.perf_counter() - start) / (steps * size)
+            except tf.errors.ResourceExhaustedError:
+                break
+            except tf.errors.InvalidArgumentError:
+                # XLA cannot compile the training step, fit then falls back to compiling without XLA
+                break
+            if time_per_path < best_time:
+                best_size, best_time = size, time_per_path
+        return best_size
+
+    def predict(self, X, batch_size=8192, keras_predict=False):
+        if keras_predict:
+            # Keras predict loop, with its callbacks and data iterator, only when explicitly requested
+            return self.rule_model.predict(X, batch_size=batch_size)
+        # Direct calls of the traced rule model, a single graph execution per slice of paths
+        logsig, BM = (tf.convert_to_tensor(x, dtype=tf.float32) for x in X)
+        # Evaluate in slices of batch_size paths to bound the memory of the activations
+        return np.concatenate([self._rule_fn(logsig[i:i + batch_size], BM[i:i + batch_size]).numpy()
+                               for i in range(0, logsig.shape[0], batch_size)])
 
     def summary(self):
         return self.model.summary()
 
     def save(self, filepath):
+        # The rule model is a subgraph of the model, sharing its weights, so saving the model to the file
+        # filepath saves both networks; load restores the rule model from it without a separate file
         self.model.save(filepath)
 
     @classmethod
     def load(cls, filepath):
-        loaded_model = models.load_model(filepath)
-        # You might need to adjust this part depending on how you want to handle the loaded model
-        instance = cls(n=1, n2=1, I=1, q=1, d=loaded_model.input_shape[0][2])
+        loaded_model = models.load_model(filepath, custom_objects={'DeepMartingales': DeepMartingales,
+                                                                   'DualStoppingLoss': DualStoppingLoss})
+        # Set up the instance around the loaded model, rather than building (and tracing) a throwaway network.
+        # Only the attributes used outside of build_network_dual are set: the compile arguments that the XLA
+        # fallback of fit and probe_batch_size need are read from the loaded model's own compile config
+        instance = cls.__new__(cls)
+        instance.n2 = loaded_model.input_shape[0][1]
+        instance.d = loaded_model.input_shape[0][2]
+        instance.strategy = tf.distribute.get_strategy()
         instance.model = loaded_model
+        # The rule model is the subgraph of the loaded model from the signature and Brownian inputs to the
+        # martingale, sharing its weights, so both networks are restored from the single saved file
+        rule_layer = next(layer for layer in loaded_model.layers if isinstance(layer, DeepMartingales))
+        instance.rule_model = tf.keras.Model([loaded_model.inputs[0], loaded_model.inputs[2]], rule_layer.output)
+        instance._rule_fn = instance.rule_function()
         return instance
\ No newline at end of file